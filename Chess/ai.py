@@ -1,5 +1,6 @@
 import copy
 import random
+import time
 
 
 # Constants
@@ -60,8 +61,132 @@ pieceSquareTables = {
           [2, 3, 1, 0, 0, 1, 3, 2]]
 }
 
-# Transposition table
+# Transposition table: key -> (depth, score, bound, bestMoveID)
 transposition_table = {}
+EXACT, LOWERBOUND, UPPERBOUND = 0, 1, 2
+TT_ENTRY_BYTES = 128  # rough footprint of one dict slot with its key and value objects
+maxTableEntries = None  # None means the table grows without limit
+
+# Zobrist keys, seeded so hashes are identical across runs and processes
+zobristRandom = random.Random(0x5EED)
+ZOBRIST_PIECES = {colour + piece: [zobristRandom.getrandbits(64) for i in range(64)]
+                  for colour in "wb" for piece in "PNBRQK"}
+ZOBRIST_BLACK_TO_MOVE = zobristRandom.getrandbits(64)
+ZOBRIST_CASTLING = [zobristRandom.getrandbits(64) for i in range(4)]
+ZOBRIST_ENPASSANT_FILE = [zobristRandom.getrandbits(64) for i in range(8)]
+
+# Optional cache.AnalysisCache consulted on table misses; deep results are written back
+analysisCache = None
+CACHE_MIN_DEPTH = DEPTH
+
+# Iterative deepening
+MAX_DEPTH = 64
+NODE_CHECK_INTERVAL = 16  # nodes between clock checks; a node costs roughly a millisecond
+MOVES_TO_GO = 30  # assumed number of moves left in the game when the clock does not say
+MOVE_OVERHEAD = 0.05  # seconds held back for GUI and network lag
+SOFT_STOP_FRACTION = 0.5  # no new iteration once this much of the soft limit is used
+
+
+def setHashSize(megabytes):
+    global maxTableEntries
+    maxTableEntries = max(1, int(megabytes * 1024 * 1024 // TT_ENTRY_BYTES))
+    if len(transposition_table) > maxTableEntries:
+        transposition_table.clear()
+
+
+def zobristHash(gs):
+    key = 0
+    for r in range(8):
+        for c in range(8):
+            square = gs.board[r][c]
+            if square != "--":
+                key ^= ZOBRIST_PIECES[square][r * 8 + c]
+    if not gs.whiteMove:
+        key ^= ZOBRIST_BLACK_TO_MOVE
+    castle = gs.currentCastlingRights
+    for i, right in enumerate((castle.wK, castle.bK, castle.wQ, castle.bQ)):
+        if right:
+            key ^= ZOBRIST_CASTLING[i]
+    if gs.enpassantPossible:
+        key ^= ZOBRIST_ENPASSANT_FILE[gs.enpassantPossible[1]]
+    return key
+
+
+def probeTransposition(key):
+    entry = transposition_table.get(key)
+    if entry is None and analysisCache is not None:
+        entry = analysisCache.probe(key)
+        if entry is not None:
+            transposition_table[key] = entry
+    return entry
+
+
+def storeTransposition(key, depth, score, bound, bestMoveID):
+    if maxTableEntries is not None and len(transposition_table) >= maxTableEntries:
+        transposition_table.clear()
+    transposition_table[key] = (depth, score, bound, bestMoveID)
+    if analysisCache is not None and depth >= CACHE_MIN_DEPTH:
+        analysisCache.store(key, depth, score, bound, bestMoveID)
+
+
+class SearchStopped(Exception):
+    pass
+
+
+class SearchControl:
+    # Shared by every node of one search. It counts nodes and aborts the search
+    # once the stop event is set, the deadline passes or the node budget runs out.
+    # softStop is read between iterations, so it can be set on a running search.
+    def __init__(self, stopEvent=None, maxTime=None, maxNodes=None, softTime=None):
+        self.stopEvent = stopEvent
+        self.startTime = time.monotonic()
+        self.maxNodes = maxNodes
+        self.nodes = 0
+        self.ttProbes = 0
+        self.ttHits = 0
+        self.iterationElapsed = 0.0  # elapsed time when the last iteration completed
+        self.setTimeLimits(softTime, maxTime)
+
+    def setTimeLimits(self, softTime=None, maxTime=None):
+        # Both limits count from now
+        now = time.monotonic()
+        self.deadline = now + maxTime if maxTime is not None else None
+        self.softStop = now + softTime * SOFT_STOP_FRACTION if softTime is not None else None
+
+    def startClock(self, softTime=None, maxTime=None):
+        # Starts the clock on a search that began without one, as on ponderhit.
+        # Completed iterations already count against the soft limit, so this
+        # returns True when the search should stop straight away.
+        self.setTimeLimits(softTime, maxTime)
+        return softTime is not None and self.iterationElapsed >= softTime * SOFT_STOP_FRACTION
+
+    def visit(self):
+        self.nodes += 1
+        if self.maxNodes is not None and self.nodes > self.maxNodes:
+            raise SearchStopped()
+        # Only look at the clock and the stop event every few nodes
+        if self.nodes % NODE_CHECK_INTERVAL == 0:
+            if self.stopEvent is not None and self.stopEvent.is_set():
+                raise SearchStopped()
+            if self.deadline is not None and time.monotonic() >= self.deadline:
+                raise SearchStopped()
+
+    def elapsed(self):
+        return time.monotonic() - self.startTime
+
+
+class SearchResult:
+    def __init__(self):
+        self.bestMove = None
+        self.score = 0
+        self.depth = 0  # last fully completed iteration
+        self.nodes = 0
+        self.ttProbes = 0
+        self.ttHits = 0
+        self.elapsed = 0.0
+        self.pv = []
+        self.lines = []  # (score, pv) for each of the multiPV best moves, best first
+
 
 def scoreMaterial(board):
     score = 0
@@ -81,64 +206,218 @@ def evaluateBoard(gs):
     score = scoreMaterial(gs.board)   
     return score
 
-def minimaxAlphaBeta(gs, validMoves, depth, alpha, beta, isMaximizing):
-    board_hash = hash(str(gs.board))
-    if board_hash in transposition_table:
-        print(f"Cache hit: {board_hash}")
-        return transposition_table[board_hash]
+def orderMoves(validMoves, ttMoveID=None):
+    # Hash move first, then captures with the most valuable victim, then the rest
+    def priority(move):
+        if move.moveID == ttMoveID:
+            return -100
+        if move.isCapture():
+            return pieceScore[move.pieceMoved[1]] - 10 * pieceScore[move.pieceCaptured[1]]
+        return 0
+    return sorted(validMoves, key=priority)
+
+def boundFor(score, alpha, beta):
+    if score <= alpha:
+        return UPPERBOUND
+    if score >= beta:
+        return LOWERBOUND
+    return EXACT
+
+def minimaxAlphaBeta(gs, validMoves, depth, alpha, beta, isMaximizing, control=None):
+    if control is not None:
+        control.visit()
+    board_hash = zobristHash(gs)
+    ttMoveID = None
+    entry = probeTransposition(board_hash)
+    if control is not None:
+        control.ttProbes += 1
+        if entry is not None:
+            control.ttHits += 1
+    if entry is not None:
+        entryDepth, entryScore, bound, ttMoveID = entry
+        if entryDepth >= depth:
+            if bound == EXACT:
+                return entryScore
+            if bound == LOWERBOUND and entryScore >= beta:
+                return entryScore
+            if bound == UPPERBOUND and entryScore <= alpha:
+                return entryScore
 
     if depth == 0 or gs.checkmate or gs.stalemate:
         score = evaluateBoard(gs)
-        transposition_table[board_hash] = score
+        storeTransposition(board_hash, depth, score, EXACT, None)
         return score
 
+    alphaOrig, betaOrig = alpha, beta
+    bestMoveID = None
     if isMaximizing:
         maxScore = -CHECKMATE
-        for move in validMoves:
+        for move in orderMoves(validMoves, ttMoveID):
             # Deep copy game state for this move
             gs_copy = copy.deepcopy(gs)
             gs_copy.makeMove(move)
-            score = minimaxAlphaBeta(gs_copy, gs_copy.getValidMove(), depth-1, alpha, beta, False)
-            maxScore = max(maxScore, score)
+            score = minimaxAlphaBeta(gs_copy, gs_copy.getValidMove(), depth-1, alpha, beta, False, control)
+            if score > maxScore or bestMoveID is None:
+                maxScore = score
+                bestMoveID = move.moveID
             alpha = max(alpha, score)
             if beta <= alpha:
                 break
-        transposition_table[board_hash] = maxScore
+        storeTransposition(board_hash, depth, maxScore, boundFor(maxScore, alphaOrig, betaOrig), bestMoveID)
         return maxScore
     else:
         minScore = CHECKMATE
-        for move in validMoves:
+        for move in orderMoves(validMoves, ttMoveID):
             # Deep copy game state for this move
             gs_copy = copy.deepcopy(gs)
             gs_copy.makeMove(move)
-            score = minimaxAlphaBeta(gs_copy, gs_copy.getValidMove(), depth-1, alpha, beta, True)
-            minScore = min(minScore, score)
+            score = minimaxAlphaBeta(gs_copy, gs_copy.getValidMove(), depth-1, alpha, beta, True, control)
+            if score < minScore or bestMoveID is None:
+                minScore = score
+                bestMoveID = move.moveID
             beta = min(beta, score)
             if beta <= alpha:
                 break
-        transposition_table[board_hash] = minScore
+        storeTransposition(board_hash, depth, minScore, boundFor(minScore, alphaOrig, betaOrig), bestMoveID)
         return minScore
 
 
-def findBestMove(gs, validMoves):
-    bestMove = None
-    bestScore = -CHECKMATE if gs.whiteMove else CHECKMATE
-    alpha = -CHECKMATE
-    beta = CHECKMATE
-
-    random.shuffle(validMoves)  # Shuffle to ensure randomness in move ordering
-
-    for move in validMoves:
+def searchRoot(gs, rootMoves, depth, control=None, multiPV=1):
+    # Returns the best multiPV (move, score) pairs, best first. Once multiPV
+    # lines are known the rest are searched with the window raised to the
+    # worst of them, so moves that cannot make the list fail low cheaply.
+    lines = []
+    for move in rootMoves:
+        alpha = -CHECKMATE
+        beta = CHECKMATE
+        if len(lines) == multiPV:
+            if gs.whiteMove:
+                alpha = lines[-1][1]
+            else:
+                beta = lines[-1][1]
         # Deep copy game state for this move
         gs_copy = copy.deepcopy(gs)
         gs_copy.makeMove(move)
-        score = minimaxAlphaBeta(gs_copy, gs_copy.getValidMove(), DEPTH-1, alpha, beta, not gs.whiteMove)
+        score = minimaxAlphaBeta(gs_copy, gs_copy.getValidMove(), depth-1, alpha, beta, not gs.whiteMove, control)
+
+        if len(lines) < multiPV or (gs.whiteMove and score > alpha) or (not gs.whiteMove and score < beta):
+            lines.append((move, score))
+            lines.sort(key=lambda line: -line[1] if gs.whiteMove else line[1])
+            del lines[multiPV:]
+
+    storeTransposition(zobristHash(gs), depth, lines[0][1], EXACT, lines[0][0].moveID)
+    return lines
+
+
+def linePrincipalVariation(gs, move, maxLength):
+    gs_copy = copy.deepcopy(gs)
+    gs_copy.makeMove(move)
+    return [move] + principalVariation(gs_copy, maxLength - 1)
+
+
+def principalVariation(gs, maxLength):
+    # Follow the hash moves from the root to rebuild the expected line of play
+    pv = []
+    gs_copy = copy.deepcopy(gs)
+    seen = set()
+    while len(pv) < maxLength:
+        key = zobristHash(gs_copy)
+        entry = probeTransposition(key)
+        if entry is None or entry[3] is None or key in seen:
+            break
+        seen.add(key)
+        move = next((m for m in gs_copy.getValidMove() if m.moveID == entry[3]), None)
+        if move is None:
+            break
+        pv.append(move)
+        gs_copy.makeMove(move)
+    return pv
 
-        if (gs.whiteMove and score > bestScore) or (not gs.whiteMove and score < bestScore):
-            bestScore = score
-            bestMove = move
 
-    return bestMove
+def centipawns(score, whiteMove):
+    # Scores are in pawns from white's view; UCI and the server report
+    # centipawns from the side to move's view
+    return int(round(score * 100)) * (1 if whiteMove else -1)
+
+
+def allocateTime(timeLeft, increment=0.0, movesToGo=None):
+    # Splits the remaining clock (in seconds) into a soft limit, after which no
+    # new iteration is started, and a hard limit that aborts the search.
+    available = max(0.0, timeLeft - MOVE_OVERHEAD)
+    soft = available / max(1, movesToGo or MOVES_TO_GO) + increment * 0.75
+    hard = max(0.01, min(soft * 4, available * 0.8))
+    return min(soft, hard), hard
+
+
+def searchIterative(gs, validMoves, maxDepth=None, maxTime=None, maxNodes=None, stopEvent=None,
+                    softTime=None, onIteration=None, multiPV=1, control=None):
+    # Searches depth 1, 2, 3, ... until a limit is hit and returns the result of
+    # the last completed iteration. maxTime and softTime are in seconds,
+    # stopEvent is any object with is_set() (e.g. threading.Event) and
+    # onIteration(result) is called after every completed iteration.
+    # With multiPV > 1 result.lines also holds the runner-up moves.
+    # A caller that needs to change the limits mid-search passes its own
+    # control, which then replaces stopEvent, maxTime, maxNodes and softTime.
+    if control is None:
+        control = SearchControl(stopEvent, maxTime, maxNodes, softTime)
+    result = SearchResult()
+    if not validMoves:
+        return result
+    rootKey = zobristHash(gs)
+    if analysisCache is not None:
+        analysisCache.refresh()
+    entry = probeTransposition(rootKey)
+    rootMoves = orderMoves(validMoves, entry[3] if entry else None)
+    result.bestMove = rootMoves[0]  # fallback if not even depth 1 completes
+
+    # A deep enough exact result from an earlier run is just looked up
+    if analysisCache is not None and maxDepth is not None and multiPV == 1:
+        cached = analysisCache.probe(rootKey)
+        cachedMove = next((m for m in rootMoves if cached and m.moveID == cached[3]), None)
+        if cachedMove is not None and cached[0] >= maxDepth and cached[2] == EXACT:
+            result.bestMove = cachedMove
+            result.score = cached[1]
+            result.depth = cached[0]
+            result.pv = principalVariation(gs, cached[0])
+            result.lines = [(result.score, result.pv)]
+            if onIteration is not None:
+                onIteration(result)
+            return result
+
+    for depth in range(1, (maxDepth or MAX_DEPTH) + 1):
+        try:
+            lines = searchRoot(gs, rootMoves, depth, control, multiPV)
+        except SearchStopped:
+            break
+        result.bestMove, result.score = lines[0]
+        result.depth = depth
+        result.nodes = control.nodes
+        result.elapsed = control.elapsed()
+        result.lines = [(score, linePrincipalVariation(gs, move, depth)) for move, score in lines]
+        result.pv = result.lines[0][1]
+        if onIteration is not None:
+            onIteration(result)
+
+        # Search the previous best lines first in the next iteration
+        for move, score in reversed(lines):
+            rootMoves.remove(move)
+            rootMoves.insert(0, move)
+        # The next iteration costs several times this one, so stop early
+        # rather than start something that will only be thrown away
+        control.iterationElapsed = result.elapsed
+        if control.softStop is not None and time.monotonic() >= control.softStop:
+            break
+
+    result.nodes = control.nodes
+    result.ttProbes = control.ttProbes
+    result.ttHits = control.ttHits
+    result.elapsed = control.elapsed()
+    return result
+
+
+def findBestMove(gs, validMoves, depth=DEPTH, maxTime=None, maxNodes=None, stopEvent=None):
+    random.shuffle(validMoves)  # Shuffle to ensure randomness in move ordering
+    return searchIterative(gs, validMoves, depth, maxTime, maxNodes, stopEvent).bestMove
 
 
 def findRandomMoves(validMoves):
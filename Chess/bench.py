@@ -0,0 +1,116 @@
+# Search regression benchmark. Searches a fixed set of positions to a fixed
+# depth on one thread and reports JSON. The total node count is a signature of
+# search behaviour: it only changes when move generation, evaluation, ordering
+# or pruning change. NPS and time-to-depth track speed.
+#
+#   python bench.py                                  print the report
+#   python bench.py --output baseline.json           save it as a baseline
+#   python bench.py --baseline baseline.json         compare and fail on slowdowns
+import argparse
+import json
+import sys
+import time
+import engine, ai
+
+BENCH_DEPTH = 3
+DEFAULT_THRESHOLD = 10.0  # percent NPS drop tolerated against the baseline
+BENCH_HASH_MB = 64
+
+POSITIONS = [
+    ("startpos", "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"),
+    ("open game", "r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3"),
+    ("italian", "r1bqk1nr/pppp1ppp/2n5/2b1p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4"),
+    ("queen's gambit", "rnbqkbnr/ppp2ppp/4p3/3p4/2PP4/8/PP2PPPP/RNBQKBNR w KQkq - 0 3"),
+    ("middlegame", "r2q1rk1/ppp2ppp/2np1n2/2b1p1B1/2B1P1b1/2NP1N2/PPP2PPP/R2Q1RK1 w - - 6 8"),
+    ("rook endgame", "8/5pk1/6p1/8/3R4/6P1/5PK1/r7 w - - 0 1"),
+    ("pawn endgame", "8/2k5/8/2p5/2P5/3K4/8/8 w - - 0 1"),
+]
+
+
+def benchPosition(name, fen, depth):
+    # Each position starts from an empty table so results do not depend on order
+    ai.transposition_table.clear()
+    gs = engine.GameState(fen)
+    iterations = []
+    result = ai.searchIterative(gs, gs.getValidMove(), maxDepth=depth,
+                                onIteration=lambda r: iterations.append((r.nodes, r.elapsed)))
+    iterationNodes = [nodes - previous for (nodes, _), (previous, _) in zip(iterations, [(0, 0)] + iterations)]
+    ebf = iterationNodes[-1] / iterationNodes[-2] if len(iterationNodes) >= 2 and iterationNodes[-2] else None
+    return {
+        "name": name,
+        "fen": fen,
+        "bestMove": result.bestMove.getUciNotation() if result.bestMove else None,
+        "score": result.score,
+        "nodes": result.nodes,
+        "time": round(result.elapsed, 4),
+        "nps": round(result.nodes / max(result.elapsed, 1e-9)),
+        "timeToDepth": [round(elapsed, 4) for _, elapsed in iterations],
+        "ttHitRate": round(result.ttHits / result.ttProbes, 4) if result.ttProbes else 0.0,
+        "ebf": round(ebf, 3) if ebf is not None else None,
+    }
+
+
+def runBench(depth=BENCH_DEPTH):
+    # A persistent cache or a leftover hash size would make the node count depend on history
+    ai.analysisCache = None
+    ai.setHashSize(BENCH_HASH_MB)
+    startTime = time.perf_counter()
+    positions = [benchPosition(name, fen, depth) for name, fen in POSITIONS]
+    elapsed = time.perf_counter() - startTime
+    nodes = sum(position["nodes"] for position in positions)
+    searchTime = sum(position["time"] for position in positions)
+    return {
+        "depth": depth,
+        "signature": nodes,
+        "nodes": nodes,
+        "time": round(elapsed, 4),
+        "nps": round(nodes / max(searchTime, 1e-9)),
+        "positions": positions,
+    }
+
+
+def compare(report, baseline, threshold):
+    comparison = {
+        "baselineNps": baseline["nps"],
+        "npsChange": round((report["nps"] - baseline["nps"]) / baseline["nps"] * 100, 2),
+        "signatureChanged": report["signature"] != baseline["signature"] or report["depth"] != baseline["depth"],
+        "threshold": threshold,
+    }
+    comparison["slowdown"] = comparison["npsChange"] < -threshold
+    return comparison
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the search benchmark and report JSON.")
+    parser.add_argument("--depth", type=int, default=BENCH_DEPTH)
+    parser.add_argument("--output", help="also write the report to this file")
+    parser.add_argument("--baseline", help="report to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="fail if NPS drops by more than this percentage")
+    args = parser.parse_args()
+
+    report = runBench(args.depth)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        report["comparison"] = compare(report, baseline, args.threshold)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+    if baseline is not None:
+        comparison = report["comparison"]
+        if comparison["signatureChanged"]:
+            print("bench: node signature changed from %d to %d" % (baseline["signature"], report["signature"]),
+                  file=sys.stderr)
+        if comparison["slowdown"]:
+            print("bench: NPS dropped %.2f%% (threshold %.2f%%)" % (-comparison["npsChange"], args.threshold),
+                  file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
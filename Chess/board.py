@@ -4,3 +4,6 @@ SQ_SIZE = HEIGHT // DM
 MAX_FPS = 60 #for animation
 SIDEBAR_WIDTH = 250
 BUTTON_HEIGHT = 50
+ANALYSIS_HEIGHT = 80 # sidebar panel with the engine's top lines
+ANALYSIS_LINES = 3
+ANALYSIS_TIME = 1.0 # seconds per position
@@ -0,0 +1,160 @@
+# Persistent analysis cache shared across runs and processes.
+#
+# The file is a 16 byte header followed by fixed size 20 byte records that are
+# only ever appended. Each record holds a Zobrist key, the score exactly as the
+# search produced it (float64, so a warm cache behaves like a cold search), the
+# depth, the bound type and the best move id. Later records for a key replace
+# earlier ones unless they are shallower, or a bound at the depth of an exact
+# score. Every process keeps an in-memory
+# index and picks up records appended by others on refresh(). compact()
+# rewrites the file with one record per key and atomically replaces the old
+# file. Once the cache grows past maxEntries it evicts the shallowest, and
+# among equal depths the oldest, entries down to a low-water mark so that the
+# next compaction is a long way off.
+import os
+import struct
+import ai
+
+try:
+    import fcntl
+except ImportError:  # no advisory locking on this platform; use from one process only
+    fcntl = None
+
+HEADER = b"CHESSAC2" + bytes(8)  # bump the version whenever RECORD changes
+RECORD = struct.Struct("<QdBBH")  # key, score, depth, bound, moveID
+NO_MOVE = 0xFFFF
+DEFAULT_MAX_ENTRIES = 1 << 20
+COMPACT_SLACK = 4096  # superseded records tolerated before compacting
+LOW_WATER = 0.8  # fraction of maxEntries kept when evicting
+
+
+def supersedes(old, depth, bound):
+    # Whether a new record replaces the entry old; at equal depth an exact score beats a bound
+    if old is None or depth > old[0]:
+        return True
+    return depth == old[0] and (bound == ai.EXACT or old[2] != ai.EXACT)
+
+
+class AnalysisCache:
+    def __init__(self, path, maxEntries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.maxEntries = maxEntries
+        self.index = {}  # key -> (depth, score, bound, moveID), oldest first
+        self.lockFile = open(path + ".lock", "a+b")
+        self.file = None
+        self.offset = 0
+        self.records = 0  # records in the file, including superseded ones
+        with self.locked(exclusive=True):
+            self.reopen()
+            if self.offset == 0:
+                self.file.write(HEADER)
+                self.offset = len(HEADER)
+
+    def locked(self, exclusive=False):
+        return FileLock(self.lockFile, exclusive)
+
+    def reopen(self):
+        if self.file is not None:
+            self.file.close()
+        self.file = open(self.path, "a+b", buffering=0)
+        self.index = {}
+        self.records = 0
+        self.file.seek(0)
+        header = self.file.read(len(HEADER))
+        if header and header != HEADER:
+            raise ValueError("Not an analysis cache file: " + self.path)
+        self.offset = len(header)
+        self.readNewRecords()
+
+    def readNewRecords(self):
+        size = os.fstat(self.file.fileno()).st_size
+        count = (size - self.offset) // RECORD.size
+        if count <= 0:
+            return
+        self.file.seek(self.offset)
+        data = self.file.read(count * RECORD.size)
+        for key, score, depth, bound, moveID in RECORD.iter_unpack(data):
+            self.remember(key, depth, score, bound, moveID)
+        self.offset += len(data)
+        self.records += count
+
+    def remember(self, key, depth, score, bound, moveID):
+        if supersedes(self.index.get(key), depth, bound):
+            # Re-inserting keeps the index ordered by when each entry was last written
+            self.index.pop(key, None)
+            self.index[key] = (depth, score, bound, None if moveID == NO_MOVE else moveID)
+
+    def replaced(self):
+        # True once another process has compacted the file under us
+        try:
+            return os.stat(self.path).st_ino != os.fstat(self.file.fileno()).st_ino
+        except FileNotFoundError:
+            return False
+
+    def refresh(self):
+        # Picks up records written by other processes since the last call
+        with self.locked():
+            if self.replaced():
+                self.reopen()
+            else:
+                self.readNewRecords()
+
+    def probe(self, key):
+        return self.index.get(key)
+
+    def store(self, key, depth, score, bound, moveID):
+        if not supersedes(self.index.get(key), min(depth, 255), bound):
+            return
+        record = RECORD.pack(key, score, min(depth, 255), bound, NO_MOVE if moveID is None else moveID)
+        with self.locked(exclusive=True):
+            if self.replaced():
+                self.reopen()
+            self.file.write(record)
+        # Our own record is read back along with anything others appended
+        self.refresh()
+        if self.records - len(self.index) > COMPACT_SLACK or len(self.index) > self.maxEntries:
+            self.compact()
+
+    def compact(self):
+        with self.locked(exclusive=True):
+            self.reopen()
+            entries = list(self.index.items())
+            if len(entries) > self.maxEntries:
+                # Deepest first, newest first among equal depths; then back to write order
+                ranked = sorted(range(len(entries)), key=lambda i: (entries[i][1][0], i), reverse=True)
+                kept = sorted(ranked[:int(self.maxEntries * LOW_WATER)])
+                entries = [entries[i] for i in kept]
+            tempPath = self.path + ".tmp"
+            with open(tempPath, "wb") as temp:
+                temp.write(HEADER)
+                for key, (depth, score, bound, moveID) in entries:
+                    temp.write(RECORD.pack(key, score, depth, bound, NO_MOVE if moveID is None else moveID))
+                temp.flush()
+                os.fsync(temp.fileno())
+            self.file.close()
+            self.file = None
+            os.replace(tempPath, self.path)
+            self.reopen()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        self.lockFile.close()
+
+
+class FileLock:
+    # Advisory lock on the sidecar lock file, which survives compaction
+    def __init__(self, lockFile, exclusive):
+        self.lockFile = lockFile
+        self.exclusive = exclusive
+
+    def __enter__(self):
+        if fcntl is not None:
+            fcntl.flock(self.lockFile.fileno(), fcntl.LOCK_EX if self.exclusive else fcntl.LOCK_SH)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self.lockFile.fileno(), fcntl.LOCK_UN)
+        return False
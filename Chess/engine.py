@@ -43,6 +43,13 @@ class Move:
     def getRankFile(self, ro, cl):
         return Move.colsToFiles[cl] + Move.rowsToRanks[ro]
 
+    def getUciNotation(self):
+        # long algebraic notation as used by UCI, e.g. e2e4 or e7e8q
+        notation = self.getChessNotation()
+        if self.promotion:
+            notation += self.promotion[1].lower()
+        return notation
+
     def isCapture(self):
         return self.pieceCaptured != "--"
 
@@ -73,8 +80,89 @@ class GameState:
         self.enpassantPossible = ()
         self.enpassantPossibleLog = [self.enpassantPossible]
         self.currentCastlingRights = CastleRights(True, True, True, True)
+        self.halfmoveClock = 0  # moves since the last capture or pawn move
+        self.halfmoveClockLog = [self.halfmoveClock]
+        self.fullmoveNumber = 1  # goes up after each black move
+        if fen:
+            self.loadFen(fen)
         self.castleRightsLog = [CastleRights(self.currentCastlingRights.wK, self.currentCastlingRights.bK, self.currentCastlingRights.wQ, self.currentCastlingRights.bQ)]
 
+    def loadFen(self, fen):
+        fields = fen.split()
+        if len(fields) < 2:
+            raise ValueError("Invalid FEN: " + fen)
+        placement, side = fields[0], fields[1]
+        castling = fields[2] if len(fields) > 2 else "-"
+        enpassant = fields[3] if len(fields) > 3 else "-"
+        try:
+            halfmoveClock = int(fields[4]) if len(fields) > 4 else 0
+            fullmoveNumber = int(fields[5]) if len(fields) > 5 else 1
+        except ValueError:
+            raise ValueError("Invalid FEN: " + fen)
+
+        rows = placement.split("/")
+        if len(rows) != 8:
+            raise ValueError("Invalid FEN: " + fen)
+        self.board = []
+        for r, rowText in enumerate(rows):
+            row = []
+            for ch in rowText:
+                if ch.isdigit():
+                    row.extend(["--"] * int(ch))
+                else:
+                    colour = 'w' if ch.isupper() else 'b'
+                    piece = ch.upper()
+                    if piece not in self.moveFunctions:
+                        raise ValueError("Invalid FEN: " + fen)
+                    row.append(colour + piece)
+                    if piece == 'K':
+                        if colour == 'w':
+                            self.whiteKingLocation = (r, len(row) - 1)
+                        else:
+                            self.blackKingLocation = (r, len(row) - 1)
+            if len(row) != 8:
+                raise ValueError("Invalid FEN: " + fen)
+            self.board.append(row)
+
+        self.whiteMove = side == 'w'
+        self.currentCastlingRights = CastleRights('K' in castling, 'k' in castling, 'Q' in castling, 'q' in castling)
+        if enpassant != "-":
+            self.enpassantPossible = (Move.ranksToRows[enpassant[1]], Move.filesToCols[enpassant[0]])
+        else:
+            self.enpassantPossible = ()
+        self.enpassantPossibleLog = [self.enpassantPossible]
+        self.halfmoveClock = halfmoveClock
+        self.halfmoveClockLog = [self.halfmoveClock]
+        self.fullmoveNumber = fullmoveNumber
+
+    def getUciMove(self, text):
+        # The legal move written as text in UCI (e2e4, e7e8q) or plain (e2e4) notation, or None
+        for move in self.getValidMove():
+            if move.getUciNotation() == text or move.getChessNotation() == text:
+                return move
+        return None
+
+    def getFen(self):
+        rows = []
+        for row in self.board:
+            rowText = ""
+            empty = 0
+            for square in row:
+                if square == "--":
+                    empty += 1
+                    continue
+                if empty:
+                    rowText += str(empty)
+                    empty = 0
+                rowText += square[1] if square[0] == 'w' else square[1].lower()
+            if empty:
+                rowText += str(empty)
+            rows.append(rowText)
+        rights = self.currentCastlingRights
+        castling = ("K" if rights.wK else "") + ("Q" if rights.wQ else "") + ("k" if rights.bK else "") + ("q" if rights.bQ else "")
+        enpassant = Move.colsToFiles[self.enpassantPossible[1]] + Move.rowsToRanks[self.enpassantPossible[0]] if self.enpassantPossible else "-"
+        return "%s %s %s %s %d %d" % ("/".join(rows), "w" if self.whiteMove else "b", castling or "-", enpassant, self.halfmoveClock, self.fullmoveNumber)
+
     def makeMove(self, move):
       
         startRow, startCol = move.startRow, move.startCol
@@ -116,6 +204,12 @@ class GameState:
 
         self.enpassantPossibleLog.append(self.enpassantPossible)
 
+        # Move counters
+        self.halfmoveClock = 0 if move.pieceMoved[1] == 'P' or move.isCapture() else self.halfmoveClock + 1
+        self.halfmoveClockLog.append(self.halfmoveClock)
+        if move.pieceMoved[0] == 'b':
+            self.fullmoveNumber += 1
+
         # Update castling rights whenever a rook or king is moved
         self.updateCastlingRights(move)
         self.castleRightsLog.append(CastleRights(self.currentCastlingRights.wK, self.currentCastlingRights.bK, self.currentCastlingRights.wQ, self.currentCastlingRights.bQ))
@@ -146,6 +240,11 @@ class GameState:
             self.enpassantPossibleLog.pop()
             self.enpassantPossible = self.enpassantPossibleLog[-1] if self.enpassantPossibleLog else ()
 
+            self.halfmoveClockLog.pop()
+            self.halfmoveClock = self.halfmoveClockLog[-1] if self.halfmoveClockLog else 0
+            if move.pieceMoved[0] == 'b':
+                self.fullmoveNumber -= 1
+
             # Undo castle move
             if move.isCastleMove:
                 if move.endCol - move.startCol == 2:  # king side castle
@@ -183,10 +282,7 @@ class GameState:
     def getValidMove(self):
         tempEnPassantPossible = self.enpassantPossible
         tempCastleRights = CastleRights(self.currentCastlingRights.wK, self.currentCastlingRights.bK, self.currentCastlingRights.wQ, self.currentCastlingRights.bQ)
-        
-        print("Current board position:")
-        self.printBoard()
-    
+
         # 1. Generate all moves
         moves = self.getAllPossibleMoves()
         if self.whiteMove:
@@ -210,18 +306,9 @@ class GameState:
         # 5. Check for checkmate or stalemate
         if len(moves) == 0:  # checkmate or stalemate
             if self.inCheck():
-                self.checkmate = True 
-                for move in self.move_log:
-                    print(move.getChessNotation())
+                self.checkmate = True
             else:
                 self.stalemate = True
-                
-                self.printBoard()
-                
-                for move in self.move_log:
-                    print(move.getChessNotation())
-            print("Board position after considering all moves:")
-            self.printBoard()    
         else:
             self.enpassantPossible = tempEnPassantPossible
             self.currentCastlingRights = tempCastleRights
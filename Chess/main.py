@@ -1,5 +1,7 @@
 import pygame as py
+import copy
 import sys
+import threading
 import engine, ai
 from board import *
 
@@ -31,11 +33,19 @@ def main():
     gameOver = False
     player1 =  True#if a human is playing it is true
     player2 = True
+    showAnalysis = False  # toggled with the A key
+    analysis = None
+    analysisJob = None  # background search for the panel, see startAnalysis
 
     while running:
         humanTurn = (gs.whiteMove and player1) or (not gs.whiteMove and player2)
         for event in py.event.get():
-            if event.type == py.MOUSEBUTTONDOWN:
+            if event.type == py.KEYDOWN and event.key == py.K_a:
+                showAnalysis = not showAnalysis
+                if not showAnalysis:
+                    stopAnalysis(analysisJob)
+                    analysisJob = None
+            elif event.type == py.MOUSEBUTTONDOWN:
                 if not gameOver and humanTurn:
                     location = py.mouse.get_pos()
                     if WIDTH < location[0] < WIDTH + SIDEBAR_WIDTH:
@@ -48,6 +58,9 @@ def main():
                         elif BUTTON_HEIGHT < location[1] < 2 * BUTTON_HEIGHT:  # Reset function
                             gs = engine.GameState()  # Reset the game state
                             validMoves = gs.getValidMove()
+                            stopAnalysis(analysisJob)
+                            analysisJob = None
+                            analysis = None
                             selectedSQ = ()
                             playerClick = []
                             moveMade = False
@@ -79,6 +92,9 @@ def main():
 
            #AI move finder
         if not gameOver and not humanTurn:
+            # The panel's search shares the transposition table, so it must not run alongside
+            stopAnalysis(analysisJob)
+            analysisJob = None
             AIMove = ai.findBestMove(gs, validMoves)
             if AIMove == None:
                 AIMove = ai.findRandomMove(validMoves)
@@ -91,11 +107,20 @@ def main():
             if animate:
                 animateMove(gs.move_log[-1], screen, gs.board, clock)
             validMoves = gs.getValidMove()
+            stopAnalysis(analysisJob)
+            analysisJob = None
+            analysis = None
             moveMade = False
             animate = False
         if event.type == py.QUIT:
                 running = False
-        drawGameState(screen, gs, validMoves, selectedSQ, moveLogFont)
+        if showAnalysis and analysis is None:
+            if analysisJob is None:
+                analysisJob = startAnalysis(gs, validMoves)
+            elif not analysisJob[0].is_alive():
+                analysis = analysisJob[2]["lines"]
+                analysisJob = None
+        drawGameState(screen, gs, validMoves, selectedSQ, moveLogFont, showAnalysis, analysis)
 
         
         if gs.checkmate or gs.stalemate:
@@ -112,6 +137,29 @@ def main():
     sys.exit()
 
 
+'''
+Run the analysis panel's search on a thread so the window keeps responding.
+Returns (thread, stopEvent, result); result["lines"] is set once it finishes.
+'''
+def startAnalysis(gs, validMoves):
+    stopEvent = threading.Event()
+    result = {}
+    gs_copy = copy.deepcopy(gs)
+    moves = list(validMoves)
+
+    def run():
+        result["lines"] = ai.searchIterative(gs_copy, moves, ai.DEPTH, ANALYSIS_TIME, stopEvent=stopEvent,
+                                             multiPV=ANALYSIS_LINES).lines
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread, stopEvent, result
+
+def stopAnalysis(analysisJob):
+    if analysisJob is not None:
+        analysisJob[1].set()
+        analysisJob[0].join()
+
 '''
 Highlight squares
 '''
@@ -130,13 +178,17 @@ def highlightSquares(screen, gs, validMoves, selectedSQ):
                     screen.blit(surface, (move.endCol * SQ_SIZE, move.endRow * SQ_SIZE))
 
 # Current Game State
-def drawGameState(screen, gs, validMoves, selectedSQ, moveLogFont):
+def drawGameState(screen, gs, validMoves, selectedSQ, moveLogFont, showAnalysis=False, analysis=None):
     # Draw the entire screen (board and sidebar)
     drawBoard(screen)  # Draw the squares on the board
     highlightSquares(screen, gs, validMoves, selectedSQ)
     drawPieces(screen, gs.board)  # Draw the pieces on top of those squares
     drawSidebar(screen)  # Draw the sidebar
-    drawMoveLog(screen, gs, moveLogFont, WIDTH + 10, 2 * BUTTON_HEIGHT + 20)
+    if not showAnalysis:
+        drawMoveLog(screen, gs, moveLogFont, WIDTH + 10, 2 * BUTTON_HEIGHT + 20)
+    else:
+        drawMoveLog(screen, gs, moveLogFont, WIDTH + 10, 2 * BUTTON_HEIGHT + 20, ANALYSIS_HEIGHT)
+        drawAnalysis(screen, analysis, moveLogFont, WIDTH + 10, HEIGHT - ANALYSIS_HEIGHT + 5)
 
 def drawBoard(screen):
     global colors
@@ -181,8 +233,9 @@ def drawSidebar(screen):
     reset_label_rect = reset_label.get_rect(center=reset_button_rect.center)
     screen.blit(reset_label, reset_label_rect)
 
-def drawMoveLog(screen, gs, font, x, y):
-    moveLogRect = py.Rect(x, y, SIDEBAR_WIDTH - 20, HEIGHT - (2 * BUTTON_HEIGHT + 20))
+def drawMoveLog(screen, gs, font, x, y, reserved=0):
+    # reserved: height kept free below the log for the analysis panel
+    moveLogRect = py.Rect(x, y, SIDEBAR_WIDTH - 20, HEIGHT - (2 * BUTTON_HEIGHT + 20) - reserved)
     py.draw.rect(screen, py.Color('white'), moveLogRect)
     moveLog = gs.move_log
     moveTexts = []
@@ -202,6 +255,26 @@ def drawMoveLog(screen, gs, font, x, y):
         textLocation = moveLogRect.move(padding, text_y + i * (textObject.get_height() + line_spacing))
         screen.blit(textObject, textLocation)
 
+'''
+Engine analysis panel: the top lines for the side to move, scores from white's view.
+lines is None while the search is still running
+'''
+def drawAnalysis(screen, lines, font, x, y):
+    panelRect = py.Rect(x, y, SIDEBAR_WIDTH - 20, ANALYSIS_HEIGHT - 10)
+    py.draw.rect(screen, py.Color('light gray'), panelRect)
+    padding = 5
+    text_y = panelRect.top + padding
+    if lines is None:
+        screen.blit(font.render("Analysing...", True, py.Color('black')), (panelRect.left + padding, text_y))
+        return
+    if not lines:
+        screen.blit(font.render("No moves to analyse", True, py.Color('black')), (panelRect.left + padding, text_y))
+    for i, (score, pv) in enumerate(lines):
+        text = "{}. {:+.2f} ".format(i + 1, score) + " ".join(move.getChessNotation() for move in pv)
+        textObject = font.render(text, True, py.Color('black'))
+        screen.blit(textObject, (panelRect.left + padding, text_y))
+        text_y += textObject.get_height() + 2
+
 '''
 Animating a move
 '''
@@ -0,0 +1,285 @@
+# Local multi-game server. Many games live as engine.GameState sessions on one
+# asyncio event loop while searches run on a bounded pool of worker processes.
+#
+# Line protocol over TCP, one command per line and one reply line per command:
+#   new [fen <fen>]               -> ok <gameId>
+#   move <gameId> <uci move>      -> ok <fen> | error ...
+#   go <gameId> [movetime <ms>]   -> bestmove <uci move> score <cp> depth <d> nodes <n> | error busy
+#   show <gameId>                 -> ok <fen>
+#   close <gameId>                -> ok
+#   metrics                       -> JSON object
+#   quit
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import copy
+import itertools
+import json
+import math
+import threading
+import time
+import engine, ai, cache
+
+DEFAULT_PORT = 8765
+DEFAULT_WORKERS = 4
+DEFAULT_QUEUE_SIZE = 64  # requests waiting for a busy worker before new ones are refused
+DEFAULT_MOVETIME = 1000  # ms
+MAX_MOVETIME = 10000  # ms
+MIN_SEARCH_TIME = 0.05  # seconds left to a request that waited most of its budget in the queue
+MAX_GAMES = 1000
+DEFAULT_CACHE_DEPTH = 4  # a bit more than DEFAULT_MOVETIME usually reaches
+WORKER_HASH_MB = 64
+LATENCY_WINDOW = 1000  # requests kept for the latency percentiles
+
+
+def initWorker(cachePath):
+    ai.setHashSize(WORKER_HASH_MB)
+    if cachePath:
+        ai.analysisCache = cache.AnalysisCache(cachePath)
+
+
+def searchPosition(fen, maxTime):
+    # Runs in a worker process; the transposition table lives on between requests
+    gs = engine.GameState(fen)
+    result = ai.searchIterative(gs, gs.getValidMove(), maxTime=maxTime, softTime=maxTime)
+    if result.bestMove is None:
+        return None, 0, 0, result.nodes
+    return result.bestMove.getUciNotation(), ai.centipawns(result.score, gs.whiteMove), result.depth, result.nodes
+
+
+def percentile(sortedValues, fraction):
+    if not sortedValues:
+        return 0.0
+    # Nearest rank
+    return sortedValues[max(0, math.ceil(fraction * len(sortedValues)) - 1)]
+
+
+class Session:
+    def __init__(self, gs):
+        self.gs = gs
+        self.lock = asyncio.Lock()  # one request per game at a time
+
+
+class Job:
+    def __init__(self, fen, budget):
+        self.fen = fen
+        self.budget = budget  # seconds, counted from when the request arrived
+        self.queuedAt = time.monotonic()
+        self.future = asyncio.get_running_loop().create_future()
+
+
+class ChessServer:
+    def __init__(self, workers=DEFAULT_WORKERS, queueSize=DEFAULT_QUEUE_SIZE, cachePath=None,
+                 cacheDepth=DEFAULT_CACHE_DEPTH):
+        if workers < 1 or queueSize < 1:
+            raise ValueError("workers and queueSize must be at least 1")
+        self.workers = workers
+        self.queueSize = queueSize
+        self.pool = concurrent.futures.ProcessPoolExecutor(workers, initializer=initWorker, initargs=(cachePath,))
+        # Admission is bounded by the admitted counter, not by the queue, so that requests
+        # dispatchers have not picked up yet still count as running rather than waiting
+        self.queue = asyncio.Queue()
+        self.admitted = 0  # searches accepted and not yet finished, running or queued
+        self.sessions = {}
+        self.gameIds = itertools.count(1)
+        self.cache = cache.AnalysisCache(cachePath) if cachePath else None
+        self.cacheDepth = cacheDepth  # shallower cached results are searched again
+        self.cacheLock = threading.Lock()  # lookups run on executor threads
+        self.inFlight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.cacheHits = 0
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self.dispatchers = []
+
+    def start(self):
+        self.dispatchers = [asyncio.create_task(self.dispatch()) for i in range(self.workers)]
+
+    async def stop(self):
+        for task in self.dispatchers:
+            task.cancel()
+        self.pool.shutdown(cancel_futures=True)
+        if self.cache is not None:
+            self.cache.close()
+
+    async def dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self.queue.get()
+            self.inFlight += 1
+            try:
+                waited = time.monotonic() - job.queuedAt
+                maxTime = max(MIN_SEARCH_TIME, job.budget - waited)
+                result = await loop.run_in_executor(self.pool, searchPosition, job.fen, maxTime)
+                if not job.future.done():
+                    job.future.set_result(result)
+            except Exception as e:
+                if not job.future.done():
+                    job.future.set_exception(e)
+            finally:
+                self.inFlight -= 1
+                self.queue.task_done()
+
+    def lookupCached(self, gs):
+        # Positions analysed deep enough before, by any worker or earlier run, skip the pool.
+        # Runs off the event loop: refresh() may wait on the file lock while a worker compacts.
+        with self.cacheLock:
+            self.cache.refresh()
+            entry = self.cache.probe(ai.zobristHash(gs))
+        if entry is None or entry[2] != ai.EXACT or entry[0] < self.cacheDepth:
+            return None
+        move = next((m for m in gs.getValidMove() if m.moveID == entry[3]), None)
+        if move is None:
+            return None
+        return move.getUciNotation(), ai.centipawns(entry[1], gs.whiteMove), entry[0], 0
+
+    def metrics(self):
+        latencies = sorted(self.latencies)
+        return {
+            "games": len(self.sessions),
+            "queueDepth": self.queue.qsize(),
+            "queueCapacity": self.queueSize,
+            "admitted": self.admitted,
+            "inFlight": self.inFlight,
+            "workers": self.workers,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "cacheHits": self.cacheHits,
+            "latencyMs": {
+                "p50": round(percentile(latencies, 0.50) * 1000, 1),
+                "p90": round(percentile(latencies, 0.90) * 1000, 1),
+                "p99": round(percentile(latencies, 0.99) * 1000, 1),
+                "max": round(latencies[-1] * 1000, 1) if latencies else 0.0,
+            },
+        }
+
+    async def handleClient(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                tokens = line.decode(errors="replace").split()
+                if not tokens:
+                    continue
+                if tokens[0] == "quit":
+                    break
+                reply = await self.handle(tokens[0], tokens[1:])
+                writer.write((reply + "\n").encode())
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def handle(self, command, args):
+        try:
+            if command == "new":
+                return self.newGame(args)
+            if command == "metrics":
+                return json.dumps(self.metrics())
+            if not args:
+                return "error missing game id"
+            session = self.sessions.get(args[0])
+            if session is None:
+                return "error unknown game " + args[0]
+            if command == "move":
+                return await self.playMove(session, args[1:])
+            if command == "go":
+                return await self.go(session, args[1:])
+            if command == "show":
+                return "ok " + session.gs.getFen()
+            if command == "close":
+                del self.sessions[args[0]]
+                return "ok"
+            return "error unknown command " + command
+        except (ValueError, KeyError, IndexError) as e:
+            return "error " + str(e)
+
+    def newGame(self, args):
+        if len(self.sessions) >= MAX_GAMES:
+            return "error too many games"
+        fen = " ".join(args[1:]) if args and args[0] == "fen" else None
+        gameId = str(next(self.gameIds))
+        self.sessions[gameId] = Session(engine.GameState(fen))
+        return "ok " + gameId
+
+    async def playMove(self, session, args):
+        if not args:
+            return "error missing move"
+        async with session.lock:
+            move = session.gs.getUciMove(args[0])
+            if move is None:
+                return "error illegal move " + args[0]
+            session.gs.makeMove(move)
+            return "ok " + session.gs.getFen()
+
+    async def go(self, session, args):
+        movetime = DEFAULT_MOVETIME
+        if len(args) >= 2 and args[0] == "movetime":
+            movetime = min(MAX_MOVETIME, max(1, int(args[1])))
+        async with session.lock:
+            startTime = time.monotonic()
+            result = None
+            if self.cache is not None:
+                result = await asyncio.get_running_loop().run_in_executor(
+                    None, self.lookupCached, copy.deepcopy(session.gs))
+            if result is not None:
+                self.cacheHits += 1
+            else:
+                if self.admitted >= self.workers + self.queueSize:
+                    self.rejected += 1
+                    return "error busy"
+                self.admitted += 1
+                try:
+                    job = Job(session.gs.getFen(), movetime / 1000)
+                    self.queue.put_nowait(job)
+                    result = await job.future
+                except concurrent.futures.process.BrokenProcessPool:
+                    return "error search worker failed"
+                finally:
+                    self.admitted -= 1
+            uci, cp, depth, nodes = result
+            if uci is None:
+                return "error no legal moves"
+            session.gs.makeMove(session.gs.getUciMove(uci))
+            self.completed += 1
+            self.latencies.append(time.monotonic() - startTime)
+            return "bestmove %s score %d depth %d nodes %d" % (uci, cp, depth, nodes)
+
+
+async def serve(host, port, workers, queueSize, cachePath, cacheDepth):
+    server = ChessServer(workers, queueSize, cachePath, cacheDepth)
+    server.start()
+    listener = await asyncio.start_server(server.handleClient, host, port)
+    print("Serving on %s:%d with %d workers" % (host, port, workers), flush=True)
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Host many concurrent chess games on one engine worker pool.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--queue", type=int, default=DEFAULT_QUEUE_SIZE, help="maximum queued search requests")
+    parser.add_argument("--cache", help="analysis cache file shared by all workers")
+    parser.add_argument("--cache-depth", type=int, default=DEFAULT_CACHE_DEPTH,
+                        help="minimum depth of a cached result to answer without searching")
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.queue < 1:
+        parser.error("--queue must be at least 1")
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.queue, args.cache, args.cache_depth))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
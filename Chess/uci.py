@@ -0,0 +1,228 @@
+# Headless UCI front end. Run it with "python uci.py" and point a chess GUI
+# or test harness at it. pygame is never imported here.
+import copy
+import sys
+import threading
+import engine, ai, cache
+
+ENGINE_NAME = "Minimax Chess"
+ENGINE_AUTHOR = "MoeHKhant"
+DEFAULT_HASH_MB = 16
+MAX_HASH_MB = 1024
+MAX_MULTIPV = 16
+
+
+def parseGo(tokens):
+    # Returns the limits and the tokens whose values could not be read
+    limits = {}
+    invalid = []
+    numeric = ("depth", "movetime", "wtime", "btime", "winc", "binc", "movestogo", "nodes")
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        if token in numeric and i + 1 < len(tokens):
+            try:
+                limits[token] = int(tokens[i + 1])
+            except ValueError:
+                invalid.append(token + " " + tokens[i + 1])
+            i += 2
+        else:
+            if token in ("infinite", "ponder"):
+                limits[token] = True
+            i += 1
+    return limits, invalid
+
+
+def timeLimitsFor(limits, whiteMove):
+    # (softTime, hardTime) in seconds, or (None, None) when there is no clock
+    if "movetime" in limits:
+        return None, limits["movetime"] / 1000
+    timeLeft = limits.get("wtime" if whiteMove else "btime")
+    if timeLeft is None:
+        return None, None
+    increment = limits.get("winc" if whiteMove else "binc", 0)
+    return ai.allocateTime(timeLeft / 1000, increment / 1000, limits.get("movestogo"))
+
+
+class UciEngine:
+    def __init__(self, out=sys.stdout):
+        self.out = out
+        self.outputLock = threading.Lock()
+        self.lock = threading.Lock()
+        self.gs = engine.GameState()
+        self.stopEvent = threading.Event()
+        self.searchThread = None
+        self.control = None
+        self.pondering = False
+        self.waitForStop = False
+        self.searchDone = False
+        self.softTime = None
+        self.hardTime = None
+        self.threads = 1
+        self.multiPV = 1
+        ai.setHashSize(DEFAULT_HASH_MB)
+
+    def send(self, line):
+        with self.outputLock:
+            self.out.write(line + "\n")
+            self.out.flush()
+
+    def handle(self, line):
+        # Returns False once the GUI asks us to quit
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, args = tokens[0], tokens[1:]
+        if command == "uci":
+            self.send("id name " + ENGINE_NAME)
+            self.send("id author " + ENGINE_AUTHOR)
+            self.send("option name Hash type spin default %d min 1 max %d" % (DEFAULT_HASH_MB, MAX_HASH_MB))
+            self.send("option name Threads type spin default 1 min 1 max 1")
+            self.send("option name Ponder type check default false")
+            self.send("option name MultiPV type spin default 1 min 1 max %d" % MAX_MULTIPV)
+            self.send("option name AnalysisCache type string default <empty>")
+            self.send("uciok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "ucinewgame":
+            self.stopSearch()
+            ai.transposition_table.clear()
+            self.gs = engine.GameState()
+        elif command == "setoption":
+            self.setOption(args)
+        elif command == "position":
+            self.stopSearch()
+            self.setPosition(args)
+        elif command == "go":
+            self.stopSearch()
+            limits, invalid = parseGo(args)
+            for text in invalid:
+                self.send("info string ignoring invalid go parameter " + text)
+            self.go(limits)
+        elif command == "stop":
+            self.stopSearch()
+        elif command == "ponderhit":
+            self.ponderhit()
+        elif command == "quit":
+            self.stopSearch()
+            return False
+        return True
+
+    def setOption(self, args):
+        if "name" not in args:
+            return
+        nameEnd = args.index("value") if "value" in args else len(args)
+        name = " ".join(args[args.index("name") + 1:nameEnd]).lower()
+        value = " ".join(args[nameEnd + 1:])
+        try:
+            if name == "hash":
+                ai.setHashSize(min(MAX_HASH_MB, max(1, int(value))))
+            elif name == "threads":
+                # The search is single threaded; the option is accepted so GUIs can set it
+                self.threads = max(1, int(value))
+            elif name == "multipv":
+                self.multiPV = min(MAX_MULTIPV, max(1, int(value)))
+            elif name == "analysiscache":
+                self.stopSearch()
+                if ai.analysisCache is not None:
+                    ai.analysisCache.close()
+                    ai.analysisCache = None
+                if value and value != "<empty>":
+                    ai.analysisCache = cache.AnalysisCache(value)
+        except (ValueError, OSError):
+            self.send("info string invalid value for option " + name)
+
+    def setPosition(self, args):
+        if "moves" in args:
+            movesIndex = args.index("moves")
+            moveTexts = args[movesIndex + 1:]
+            args = args[:movesIndex]
+        else:
+            moveTexts = []
+        try:
+            if args and args[0] == "fen":
+                gs = engine.GameState(" ".join(args[1:]))
+            else:
+                gs = engine.GameState()
+        except (ValueError, KeyError, IndexError):
+            self.send("info string invalid position")
+            return
+        for text in moveTexts:
+            move = gs.getUciMove(text)
+            if move is None:
+                self.send("info string illegal move " + text)
+                break
+            gs.makeMove(move)
+        self.gs = gs
+
+    def go(self, limits):
+        self.softTime, self.hardTime = timeLimitsFor(limits, self.gs.whiteMove)
+        self.pondering = bool(limits.get("ponder"))
+        self.waitForStop = self.pondering or bool(limits.get("infinite"))
+        self.searchDone = False
+        self.stopEvent.clear()
+        if "depth" in limits:
+            maxDepth = limits["depth"]
+        elif self.waitForStop or self.hardTime is not None or "nodes" in limits:
+            maxDepth = None
+        else:
+            maxDepth = ai.DEPTH
+        # While pondering the clock only starts running on ponderhit
+        if self.pondering:
+            self.control = ai.SearchControl(self.stopEvent, maxNodes=limits.get("nodes"))
+        else:
+            self.control = ai.SearchControl(self.stopEvent, self.hardTime, limits.get("nodes"), self.softTime)
+        self.searchThread = threading.Thread(
+            target=self.search, args=(copy.deepcopy(self.gs), maxDepth, self.control), daemon=True)
+        self.searchThread.start()
+
+    def search(self, gs, maxDepth, control):
+        whiteMove = gs.whiteMove
+
+        def onIteration(result):
+            for i, (score, pv) in enumerate(result.lines):
+                cp = ai.centipawns(score, whiteMove)
+                self.send("info depth %d multipv %d score cp %d nodes %d nps %d time %d pv %s" % (
+                    result.depth, i + 1, cp, result.nodes, result.nodes / max(result.elapsed, 0.001),
+                    result.elapsed * 1000, " ".join(move.getUciNotation() for move in pv)))
+
+        validMoves = gs.getValidMove()
+        result = ai.searchIterative(gs, validMoves, maxDepth, onIteration=onIteration, multiPV=self.multiPV,
+                                    control=control)
+        bestMove = result.bestMove
+
+        # In infinite and ponder mode the GUI decides when the move is reported
+        with self.lock:
+            self.searchDone = True
+            wait = self.waitForStop
+        if wait:
+            self.stopEvent.wait()
+        self.send("bestmove " + (bestMove.getUciNotation() if bestMove else "0000"))
+
+    def ponderhit(self):
+        with self.lock:
+            if not self.pondering:
+                return
+            self.pondering = False
+            self.waitForStop = False
+            if self.searchDone or self.control.startClock(self.softTime, self.hardTime):
+                self.stopEvent.set()
+
+    def stopSearch(self):
+        if self.searchThread is not None:
+            self.stopEvent.set()
+            self.searchThread.join()
+            self.searchThread = None
+
+
+def main():
+    uciEngine = UciEngine()
+    # Searches run on their own thread, so this loop keeps reading commands
+    # and "stop" reaches a running search immediately
+    for line in sys.stdin:
+        if not uciEngine.handle(line):
+            break
+
+
+if __name__ == "__main__":
+    main()